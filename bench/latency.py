@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# End-to-end latency and throughput harness, ArtNet in to bus out.
+#
+# A synthetic sender plays ArtDmx frames like QLC+ does for the universes that
+# have an output in qlcplus/qlcconfig.qxw. They go through the real
+# artnet2mqtt and mqtt2mendeleev code, connected by an in-process stand-in for
+# the MQTT broker, to a fake bus on a pty. Every frame changes a number of
+# elements to a colour that encodes the frame number, so the fake bus can
+# tell when a value was sent. It stamps and answers frames from its own
+# thread, with the wire time of a real bus.
+#
+# Updates that did not reach the bus before the end of --drain count as
+# dropped, whether the bridges skipped them or still had them queued.
+#
+# Both bridges share one event loop here, in production they are separate
+# processes with a real broker in between, so this is a lower bound.
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import runpy
+import socket
+import struct
+import sys
+import threading
+import time
+import tty
+import types
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import asyncio_mqtt as aiomqtt
+
+from mendeleev.artnet import (ARTNET_DMX_LENGTH, ARTNET_HEADER, OP_DMX,
+                              universe_elements)
+from mendeleev.connection import MendeleevConnection
+from mendeleev.frame import (COMMAND_CODES, NUM_ELEMENTS, MendeleevFrame,
+                             unpack_colors)
+from mendeleev.line import LineSettings
+
+QLC_WORKSPACE = os.path.join(ROOT, "qlcplus", "qlcconfig.qxw")
+QLC_NS = "{http://www.qlcplus.org/Workspace}"
+
+def qlc_universes(path):
+    # the universes QLC+ sends ArtNet for
+    universes = []
+    for universe in ET.parse(path).getroot().iter(QLC_NS + "Universe"):
+        output = universe.find(QLC_NS + "Output")
+        if output is not None and output.get("Plugin") == "ArtNet":
+            universes.append(int(universe.get("ID")))
+    return universes
+
+# In-process stand-in for the MQTT broker and asyncio_mqtt.Client
+class FakeBroker:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.clients = []
+        self.retained = {}
+
+    def route(self, topic, payload, qos, retain):
+        if retain:
+            self.retained[topic] = payload
+        for client in self.clients:
+            client.deliver(topic, payload, qos, False)
+
+class FakeClient:
+    def __init__(self, broker, hostname, *args, **kwargs):
+        self.broker = broker
+        self.filters = []
+        self.queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        self.broker.clients.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.clients.remove(self)
+
+    async def publish(self, topic, payload=None, qos=0, retain=False, **kwargs):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if self.broker.delay:
+            await asyncio.sleep(self.broker.delay)
+        self.broker.route(topic, payload if payload is not None else b"", qos, retain)
+
+    async def subscribe(self, topic, *args, **kwargs):
+        self.filters.append(topic)
+        for retained_topic, payload in self.broker.retained.items():
+            self.deliver(retained_topic, payload, 0, True)
+
+    def deliver(self, topic, payload, qos, retain):
+        if any(aiomqtt.Topic(topic).matches(f) for f in self.filters):
+            self.queue.put_nowait(aiomqtt.Message(topic, payload, qos, retain, 0, None))
+
+    async def _messages(self):
+        while True:
+            yield await self.queue.get()
+
+    @contextlib.asynccontextmanager
+    async def messages(self, *args, **kwargs):
+        yield self._messages()
+
+# Element side of the bus on a pty, answers every present element after the
+# wire time of request and response plus a processing delay
+class FakeBus(threading.Thread):
+    def __init__(self, present, delay, baudrate):
+        super().__init__(name="fake-bus", daemon=True)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+        self.present = set(present)
+        self.delay = delay
+        self.line = LineSettings(baudrate)
+        self.connection = MendeleevConnection(0xFF)
+        self.arrivals = [] # (time, element, color)
+        self.frames = 0
+        self.line_free = 0.0 # when the simulated line is idle again
+        self.running = True
+
+    def run(self):
+        try:
+            while self.running:
+                data = os.read(self.master, 4096)
+                now = time.monotonic()
+                for event in self.connection.receive_data(data):
+                    self.received(now, event.frame)
+        except OSError:
+            # EIO once every slave side is closed
+            pass
+
+    def transmit(self, start, length):
+        # time the last byte of a frame is on the simulated line
+        self.line_free = max(start, self.line_free) + self.line.wire_time(length)
+        return self.line_free
+
+    def received(self, now, frame):
+        now = self.transmit(now, len(MendeleevConnection.PREAMBLE) + len(frame))
+        self.frames += 1
+        if frame.cmd == COMMAND_CODES["setcolor"]:
+            self.arrivals.append((now, frame.destination, frame.payload))
+        elif frame.cmd == COMMAND_CODES["setcolors"]:
+            self.arrivals.extend((now, element, color) for element, color in unpack_colors(frame.payload))
+        if frame.destination not in self.present:
+            return
+        payload = b"v1.0" if frame.cmd == COMMAND_CODES["version"] else b""
+        response = MendeleevFrame(destination=frame.source, source=frame.destination, sequence_nr=frame.sequence_nr, cmd=frame.cmd, payload=payload)
+        data = MendeleevConnection.to_bytes(response)
+        time.sleep(max(0, self.transmit(now + self.delay, len(data)) - time.monotonic()))
+        os.write(self.master, data)
+
+    def close(self):
+        self.running = False
+        os.close(self.slave)
+        self.join(1.0)
+        os.close(self.master)
+
+def encode(tick):
+    return struct.pack(">H", tick & 0xFFFF) + b"\x00" * 5
+
+def decode(color):
+    return struct.unpack_from(">H", color)[0]
+
+def artdmx(universe, sequence, data):
+    return ARTNET_HEADER + struct.pack("<H", OP_DMX) + struct.pack(">HBB", 14, sequence, 0) + \
+        struct.pack("<H", universe) + struct.pack(">H", len(data)) + bytes(data)
+
+async def send_artnet(port, universes, rate, duration, changed, sent):
+    # QLC+ sends every universe every frame, changed or not
+    loop = asyncio.get_running_loop()
+    dmx = {universe: bytearray(ARTNET_DMX_LENGTH) for universe in universes}
+    patched = {}
+    for universe in universes:
+        for i, (element, _) in enumerate(universe_elements(universe, dmx[universe])):
+            patched[element] = (universe, i)
+    elements = sorted(patched)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        start = loop.time()
+        tick = 1
+        while loop.time() - start < duration:
+            for j in range(changed):
+                universe, i = patched[elements[((tick - 1) * changed + j) % len(elements)]]
+                dmx[universe][i * 7:(i + 1) * 7] = encode(tick)
+            sent[tick] = time.monotonic()
+            for universe in universes:
+                sock.sendto(artdmx(universe, tick & 0xFF, dmx[universe]), ("127.0.0.1", port))
+            await asyncio.sleep(max(0, start + tick / rate - loop.time()))
+            tick += 1
+    return tick - 1
+
+def load_script(name, broker):
+    namespace = runpy.run_path(os.path.join(ROOT, "bin", name), run_name="latency")
+    module = namespace["main"].__globals__
+    module["aiomqtt"] = types.SimpleNamespace(Client=functools.partial(FakeClient, broker), MqttError=aiomqtt.MqttError)
+    return module
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    broker = FakeBroker(args.mqtt_delay)
+    universes = args.universe or qlc_universes(args.workspace)
+    bus = FakeBus(range(1, args.present + 1), args.element_delay, args.baudrate)
+    bus.start()
+
+    artnet2mqtt = load_script("artnet2mqtt", broker)
+    artnet2mqtt["PORT"] = args.port
+    mqtt2mendeleev = load_script("mqtt2mendeleev", broker)
+    bridge = mqtt2mendeleev["MendeleevBridge"](bus.device, "broker", args.prefix, None, None, 0.01, 1.0, 3600, 3, 5, 25,
+                                               backend=args.backend)
+    tasks = [asyncio.ensure_future(bridge.main()),
+             asyncio.ensure_future(artnet2mqtt["artnetbridge"](loop, None, "broker", args.prefix))]
+    try:
+        while bridge.client is None or not bridge.roster.swept or not bridge.client.filters or len(broker.clients) < 2:
+            await asyncio.sleep(0.05)
+        del bus.arrivals[:]
+        frames = bus.frames
+
+        sent = {}
+        ticks = await send_artnet(args.port, universes, args.rate, args.duration, args.changed, sent)
+        end = time.monotonic()
+        await asyncio.sleep(args.drain)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await bridge.serial.disconnect()
+        bus.close()
+
+    latencies = []
+    delivered = set()
+    for arrival, element, color in bus.arrivals:
+        tick = decode(color)
+        if tick in sent and (element, tick) not in delivered:
+            delivered.add((element, tick))
+            latencies.append(arrival - sent[tick])
+    expected = ticks * args.changed
+    window = max(arrival for arrival, _, _ in bus.arrivals) - min(sent.values()) if bus.arrivals else 0
+    result = {
+        "universes": universes,
+        "rate": args.rate,
+        "ticks": ticks,
+        "expected": expected,
+        "delivered": len(delivered),
+        "dropped": expected - len(delivered),
+        "updates_per_s": len(delivered) / window if window else 0.0,
+        "frames_per_s": len({tick for _, tick in delivered}) / window if window else 0.0,
+        "bus_frames": bus.frames - frames,
+        "late": sum(1 for arrival, _, _ in bus.arrivals if arrival > end),
+    }
+    if latencies:
+        result.update({"p50_ms": percentile(latencies, 50) * 1000, "p95_ms": percentile(latencies, 95) * 1000,
+                       "p99_ms": percentile(latencies, 99) * 1000, "max_ms": max(latencies) * 1000})
+    return result
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Measure ArtNet to bus latency and throughput through artnet2mqtt and mqtt2mendeleev")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="The time to send ArtNet frames")
+    parser.add_argument("-r", "--rate", type=float, default=44, help="The ArtNet frame rate")
+    parser.add_argument("-c", "--changed", type=int, default=1, help="The number of elements changed per ArtNet frame")
+    parser.add_argument("-u", "--universe", type=int, action="append", help="Universe to send (default: the ArtNet outputs in the QLC+ workspace)")
+    parser.add_argument("-w", "--workspace", default=QLC_WORKSPACE, help="The QLC+ workspace")
+    parser.add_argument("-p", "--prefix", default="mendeleev", help="The MQTT topic prefix")
+    parser.add_argument("--port", type=int, default=6454, help="The ArtNet port")
+    parser.add_argument("--present", type=int, default=NUM_ELEMENTS, help="The number of elements on the fake bus")
+    parser.add_argument("--element-delay", type=float, default=0.001, help="The processing time of an element before it answers")
+    parser.add_argument("--baudrate", type=int, default=38400, help="The line rate the fake bus simulates")
+    parser.add_argument("--mqtt-delay", type=float, default=0.0, help="The delay of every publish through the broker stand-in")
+    parser.add_argument("--drain", type=float, default=2.0, help="The time to wait for late frames after sending stopped")
+    parser.add_argument("-B", "--backend", default="serial", help="The bus backend")
+    parser.add_argument("--max-p99", type=float, default=None, help="Fail when the p99 latency in ms is higher")
+    parser.add_argument("--max-dropped", type=int, default=None, help="Fail when more updates are dropped")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print("%-15s %s" % (key, ("%.2f" % value) if isinstance(value, float) else value))
+
+    failed = "p99_ms" not in result
+    if args.max_p99 is not None and result.get("p99_ms", float("inf")) > args.max_p99:
+        failed = True
+    if args.max_dropped is not None and result["dropped"] > args.max_dropped:
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
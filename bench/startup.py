@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Startup time regression check for the runtime entry points.
+#
+# Every entry point is imported in a fresh interpreter with -X importtime, the
+# interpreter's own startup imports are subtracted. The check fails when scapy
+# ends up on the import path or when the import takes longer than the budget.
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "mendeleev.mendeleev_serial": "import mendeleev.mendeleev_serial",
+    "mendeleev.mendeleev_protocol": "import mendeleev.mendeleev_protocol",
+    "bin/mqtt2mendeleev": "import runpy; runpy.run_path('bin/mqtt2mendeleev', run_name='startup')",
+    "bin/artnet2mqtt": "import runpy; runpy.run_path('bin/artnet2mqtt', run_name='startup')",
+    "bin/artnet2mendeleev": "import runpy; runpy.run_path('bin/artnet2mendeleev', run_name='startup')",
+}
+
+FORBIDDEN = ("scapy",)
+
+def import_time(code):
+    # returns (total import time in us, imported top level modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip().split(".")[0])
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Check the import time of the runtime entry points")
+    parser.add_argument("-m", "--max-ms", type=float, default=300, help="The allowed import time per entry point")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="The number of runs per entry point, the fastest counts")
+
+    args = parser.parse_args(argv)
+
+    baseline = min(import_time("pass")[0] for _ in range(args.repeat))
+    failed = False
+    for name, code in ENTRY_POINTS.items():
+        try:
+            runs = [import_time(code) for _ in range(args.repeat)]
+        except Exception as e:
+            print("%-30s ERROR %s" % (name, e))
+            failed = True
+            continue
+        total = (min(t for t, _ in runs) - baseline) / 1000
+        forbidden = sorted(set(FORBIDDEN) & runs[0][1])
+        ok = total <= args.max_ms and not forbidden
+        print("%-30s %8.1f ms %s%s" % (name, total, "ok" if ok else "FAIL", (" (imports %s)" % ", ".join(forbidden)) if forbidden else ""))
+        failed |= not ok
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -6,18 +6,20 @@ import sys
 import struct
 import aioconsole
 
+from mendeleev.line import LineSettings
 from mendeleev.mendeleev_serial import MendeleevSerial
 
 logger = logging.getLogger(__name__)
 
 NUM_ELEMENTS = 118
+SETUP_READY = b"\x01"
 
 async def address_iterator(default=1):
     return int((await aioconsole.ainput('which address do you want to set? [%d]' % (default))) or default)
 
 class AddressingProcedure:
-    def __init__(self, device, broadcasttimeout, automode):
-        self.m = MendeleevSerial(device)
+    def __init__(self, device, broadcasttimeout, automode, line=None):
+        self.m = MendeleevSerial(device, line=line)
         self.broadcasttimeout = broadcasttimeout
         self.automode = automode
 
@@ -28,10 +30,12 @@ class AddressingProcedure:
         if next_addr <= 0 or next_addr > NUM_ELEMENTS:
             raise Exception("invalid address to set: %d" % (next_addr))
         # wait indefinitely for a setup_ready broadcast
-        print("Please touch the element to set address %d" % (next_addr))
-        result = await self.m.receive(destination=0xFF, timeout=timeout)
-        if result is None or result.cmd != 0x06 or result.payload.load[0] != 0x01:
-            raise Exception("expected to receive a setup_ready response")
+        with self.m.subscribe(destination=0xFF, cmd="setup") as frames:
+            print("Please touch the element to set address %d" % (next_addr))
+            result = await frames.get(timeout)
+            while result.payload[:1] != SETUP_READY:
+                logger.debug("ignoring setup frame from %d: %s", result.source, result.payload.hex())
+                result = await frames.get(timeout)
         print("received setup_ready from %d" % (result.source))
 
         # wait a bit
@@ -69,7 +73,8 @@ class AddressingProcedure:
 def main(argv):
     parser = argparse.ArgumentParser(description="Set up Mendeleev MQTT bridge")
     parser.add_argument("-d", "--device", required=True, help="The RS485 tty device")
-    parser.add_argument("-w", "--broadcastwait", type=int, default=.5, help="The time to wait between broadcast messages")
+    parser.add_argument("-w", "--broadcastwait", type=float, default=None, help="The time to wait between broadcast messages (default: frame wire time)")
+    LineSettings.add_arguments(parser, speedup=False)
     parser.add_argument("-l", "--log", default="INFO", dest="logLevel", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
     parser.add_argument("-f", "--logfile", default=None, help="set logfile")
     parser.add_argument("-a", "--auto", action='store_true', help="automatic mode")
@@ -82,7 +87,7 @@ def main(argv):
 
     logger.info("Starting on %s", args.device)
     loop = asyncio.get_event_loop()
-    p = AddressingProcedure(args.device, args.broadcastwait, args.auto)
+    p = AddressingProcedure(args.device, args.broadcastwait, args.auto, LineSettings.from_args(args))
     try:
         loop.run_until_complete(p.main())
     except KeyboardInterrupt:
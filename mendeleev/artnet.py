@@ -0,0 +1,105 @@
+import socket
+import struct
+
+from mendeleev.frame import NUM_ELEMENTS
+
+# Plain struct based ArtNet parsing for the receive path. The scapy layers in
+# mendeleev.layers.artnet are only needed to dissect or show a packet.
+
+ARTNET_HEADER = b"Art-Net\x00"
+ARTNET_PORT = 6454
+ARTNET_DMX_LENGTH = 512
+
+OP_POLL = 0x2000
+OP_POLL_REPLY = 0x2100
+OP_DMX = 0x5000
+
+OEM_UNKNOWN = 0x00FF
+MAX_PORTS = 4
+PORT_OUTPUT_DMX = 0x80 # port type: outputs DMX from Art-Net
+GOOD_OUTPUT_DATA = 0x80 # output status: data is being transmitted
+STYLE_NODE = 0x00
+STATUS2_PORT_ADDRESS_15BIT = 0x08
+
+CHANNELS_PER_ELEMENT = 7
+ELEMENTS_PER_UNIVERSE = ARTNET_DMX_LENGTH // CHANNELS_PER_ELEMENT
+
+_OPCODE_OFFSET = 8
+_UNIVERSE_OFFSET = 14
+_LENGTH_OFFSET = 16
+_DMX_OFFSET = 18
+_SHORT_NAME_LENGTH = 18
+_LONG_NAME_LENGTH = 64
+_REPORT_LENGTH = 64
+
+# ArtPollReply after the id and opcode, Art-Net 4 (239 bytes in total)
+# port and ESTA code are little endian, packed separately
+_POLL_REPLY = struct.Struct(">4s2sHBBHBB2s18s64s64sH4s4s4s4s4sBBBBBBB6s4sBB4sB6sHH11x")
+
+def opcode(data):
+    if len(data) < _OPCODE_OFFSET + 2 or not data.startswith(ARTNET_HEADER):
+        return None
+    return struct.unpack_from("<H", data, _OPCODE_OFFSET)[0]
+
+def dmx_universe(data):
+    if len(data) < _UNIVERSE_OFFSET + 2:
+        return None
+    return struct.unpack_from("<H", data, _UNIVERSE_OFFSET)[0]
+
+def parse_dmx(data):
+    # returns (universe, dmx data) of an ArtDmx packet
+    if len(data) < _DMX_OFFSET:
+        raise ValueError("ArtDmx packet too short: %d" % (len(data)))
+    universe = dmx_universe(data)
+    length = struct.unpack_from(">H", data, _LENGTH_OFFSET)[0]
+    dmx = data[_DMX_OFFSET:_DMX_OFFSET + length]
+    if len(dmx) != length:
+        raise ValueError("ArtDmx data truncated: %d != %d" % (len(dmx), length))
+    return universe, dmx
+
+def universe_elements(universe, data):
+    # yields (element, channel data) of the elements patched in a universe
+    first = universe * ELEMENTS_PER_UNIVERSE + 1
+    last = min(first + ELEMENTS_PER_UNIVERSE, NUM_ELEMENTS + 1)
+    for i, element in enumerate(range(first, last)):
+        yield element, data[i * CHANNELS_PER_ELEMENT:(i + 1) * CHANNELS_PER_ELEMENT]
+
+def consumed_universes():
+    # the universes that have elements patched
+    return list(range((NUM_ELEMENTS + ELEMENTS_PER_UNIVERSE - 1) // ELEMENTS_PER_UNIVERSE))
+
+def local_address(remote):
+    # the address of the interface we reach a remote host over
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((remote, ARTNET_PORT))
+        return sock.getsockname()[0]
+
+def poll_replies(address, universes, short_name="mendeleev", long_name="Mendeleev periodic table", report="", mac=b"\x00" * 6):
+    # ArtPollReply packets advertising universes as DMX output ports, up to
+    # 4 ports per packet, the ports of one packet share their net and subnet
+    groups = {}
+    for universe in sorted(universes):
+        groups.setdefault(universe >> 4, []).append(universe)
+    chunks = [(net_subnet, group[i:i + MAX_PORTS]) for net_subnet, group in sorted(groups.items()) for i in range(0, len(group), MAX_PORTS)]
+    replies = []
+    for bind_index, (net_subnet, ports) in enumerate(chunks, 1):
+        padding = bytes(MAX_PORTS - len(ports))
+        body = _POLL_REPLY.pack(
+            socket.inet_aton(address), struct.pack("<H", ARTNET_PORT),
+            0, (net_subnet >> 4) & 0x7F, net_subnet & 0x0F, OEM_UNKNOWN, 0, 0,
+            bytes(2), # ESTA manufacturer code
+            short_name.encode("ascii")[:_SHORT_NAME_LENGTH - 1],
+            long_name.encode("ascii")[:_LONG_NAME_LENGTH - 1],
+            report.encode("ascii")[:_REPORT_LENGTH - 1],
+            len(ports),
+            bytes([PORT_OUTPUT_DMX] * len(ports)) + padding,
+            bytes(MAX_PORTS), # good input
+            bytes([GOOD_OUTPUT_DATA] * len(ports)) + padding,
+            bytes(MAX_PORTS), # sw in
+            bytes(universe & 0x0F for universe in ports) + padding,
+            0, 0, 0, 0, 0, 0, STYLE_NODE,
+            mac, socket.inet_aton(address), bind_index, STATUS2_PORT_ADDRESS_15BIT,
+            bytes(MAX_PORTS), 0, bytes(6), # good output b, status3, default responder
+            0, 0) # user, refresh rate
+        replies.append(ARTNET_HEADER + struct.pack("<H", OP_POLL_REPLY) + body)
+    return replies
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+
+from mendeleev.bus import CommandFailedException
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenException(Exception):
+    pass
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.state = self.CLOSED
+        self.failures = 0
+        self.held = {}
+
+    def success(self):
+        self.failures = 0
+        if self.state == self.OPEN:
+            self.state = self.CLOSED
+            return True
+        return False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.CLOSED and self.failures >= self.threshold:
+            self.state = self.OPEN
+            return True
+        return False
+
+# Per-element circuit breakers around the send path. After `threshold`
+# consecutive timeouts commands to an element fail fast. Commands that only
+# set state are held, latest value only, and sent when the element answers
+# a probe again.
+class CircuitBreakers:
+    HOLD_COMMANDS = ("setcolor", "setmode", "setoutput")
+    _IDLE_POLL = 0.01
+
+    def __init__(self, bus, threshold=3, probe_interval=5.0, on_change=None):
+        self.bus = bus
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.on_change = on_change
+        self._breakers = {}
+
+    def get(self, element):
+        if element not in self._breakers:
+            self._breakers[element] = CircuitBreaker(self.threshold)
+        return self._breakers[element]
+
+    def is_open(self, element):
+        return element in self._breakers and self._breakers[element].state == CircuitBreaker.OPEN
+
+    def open_elements(self):
+        return [element for element, breaker in self._breakers.items() if breaker.state == CircuitBreaker.OPEN]
+
+    async def _changed(self, element, state):
+        logger.info("circuit breaker of element %d %s", element, state)
+        if self.on_change is not None:
+            await self.on_change(element, state)
+
+    async def send_cmd(self, element, command, data, timeout=None):
+        breaker = self.get(element)
+        if breaker.state == CircuitBreaker.OPEN:
+            if command in self.HOLD_COMMANDS:
+                breaker.held[command] = data
+            raise CircuitOpenException("element %d is not responding" % (element))
+        try:
+            response = await self.bus.send_cmd(element, command, data, timeout)
+        except asyncio.TimeoutError:
+            if breaker.failure():
+                await self._changed(element, breaker.state)
+            raise
+        breaker.success()
+        return response
+
+    async def probe(self, element):
+        breaker = self.get(element)
+        # only an answer counts, a nack included
+        try:
+            await self.bus.send_cmd(element, "version", b"")
+        except CommandFailedException as e:
+            logger.warning("unexpected probe answer from element %d: %s", element, e)
+        except (asyncio.TimeoutError, ConnectionError):
+            return False
+        except Exception as e:
+            logger.warning("probing element %d failed: %s", element, e)
+            return False
+        if not breaker.success():
+            return True
+        held, breaker.held = breaker.held, {}
+        for command, data in held.items():
+            try:
+                await self.bus.send_cmd(element, command, data)
+            except Exception as e:
+                logger.warning("could not replay %s to element %d: %s", command, element, e)
+        await self._changed(element, breaker.state)
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for element in self.open_elements():
+                deadline = time.monotonic() + self.probe_interval
+                while self.bus.busy() and time.monotonic() < deadline:
+                    await asyncio.sleep(self._IDLE_POLL)
+                try:
+                    await self.probe(element)
+                except Exception as e:
+                    logger.error("probing element %d failed", element)
+                    logger.exception(e)
@@ -0,0 +1,390 @@
+import asyncio
+import importlib
+import logging
+import struct
+
+from mendeleev.connection import MendeleevConnection, ResponseReceived
+from mendeleev.line import DEFAULT_BAUD_RATE, LineSettings
+from mendeleev.link import Backoff, LinkGate
+from mendeleev.profiling import stage
+from mendeleev.rtt import RttEstimator
+from mendeleev.state import TableState
+from mendeleev.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+class CommandFailedException(Exception):
+    # the element answered, but not with an ack
+    pass
+
+SETUP_BAUDRATE = 0x04 # setup sub-command, followed by the new line rate (>I)
+
+BACKENDS = {
+    "serial": ("mendeleev.mendeleev_serial", "MendeleevSerial"),
+    "protocol": ("mendeleev.mendeleev_protocol", "MendeleevProtocol"),
+    "thread": ("mendeleev.mendeleev_thread", "MendeleevThread"),
+    "fd": ("mendeleev.mendeleev_fd", "MendeleevFd"),
+}
+
+def create_bus(backend, device, **kwargs):
+    module, name = BACKENDS[backend]
+    return getattr(importlib.import_module(module), name)(device, **kwargs)
+
+# Asyncio side shared by all backends: request/response with adaptive
+# timeouts, reconnecting, table state replay, line rate changes. Backends implement _open(),
+# _write() and _close(), feed received bytes to _data_received() and report
+# a broken link with _connection_lost().
+class MendeleevBus:
+    _BROADCAST_GUARD = 0.005
+    _CONNECT_TIMEOUT = 5
+    _BAUDRATE_SETTLE = 0.05
+    _VERIFY_ATTEMPTS = 2
+    _FALLBACK_TIMEOUTS = 3
+    _FALLBACK_ELEMENTS = 2 # a single dead element is a matter for its breaker
+    _REPLAY_TIMEOUT = 0.05
+    _REPLAY_ATTEMPTS = 2
+    # fragments are written to flash, which the adaptive timeout never sees
+    _OTA_TIMEOUT = 3
+    _OTA_WAIT = 0.5
+
+    def __init__(self, device, src_addr=0, rtt_min=0.01, rtt_max=1.0, max_pending=64, line=None):
+        self._device = device
+        self.line = line if line is not None else LineSettings()
+        self._connection = MendeleevConnection(src_addr)
+        self.rtt = RttEstimator(rtt_min, rtt_max)
+        self.state = TableState()
+        self._loop = None
+        self._request_lock = None
+        self._link = LinkGate(max_pending)
+        self._backoff = Backoff()
+        self._running = False
+        self._reconnecting = False
+        self._responses = {}
+        self._quiet_until = 0.0
+        # elements that answered at the current line rate, how many requests
+        # to them timed out in a row since and to which of them
+        self._answered = set()
+        self._timeouts = 0
+        self._timed_out_elements = set()
+        self._falling_back = False
+        self._subscriptions = []
+        # replay colours as packed setcolors broadcasts, and only to the
+        # elements in present (anything with __contains__, None for all)
+        self.packed = False
+        self.present = None
+
+    async def _open(self):
+        raise NotImplementedError
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def busy(self):
+        return self._request_lock is not None and self._request_lock.locked()
+
+    def _wire_time(self, length):
+        return self.line.wire_time(length)
+
+    async def connect(self):
+        if self._running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._request_lock = asyncio.Lock()
+        self._running = True
+        await self._reconnect()
+
+    async def disconnect(self):
+        self._running = False
+        self._link.set_down()
+        self._close()
+
+    async def _reconnect(self):
+        self._reconnecting = True
+        self._backoff.reset()
+        try:
+            while self._running:
+                await asyncio.sleep(self._backoff.next())
+                self._close()
+                self._connection.reset()
+                try:
+                    await asyncio.wait_for(self._open(), self._CONNECT_TIMEOUT)
+                except (OSError, asyncio.TimeoutError) as exc:
+                    logger.warning("could not connect to %s: %s", self._device, exc)
+                    continue
+                logger.info("Connected to %s", self._device)
+                try:
+                    async with self._request_lock:
+                        await self._replay()
+                except ConnectionError as exc:
+                    logger.warning("lost %s while replaying: %s", self._device, exc)
+                    continue
+                self._link.set_up()
+                return
+        finally:
+            self._reconnecting = False
+
+    def _connection_lost(self, exc):
+        for response in self._responses.values():
+            if not response.done():
+                response.set_exception(ConnectionError("lost connection to %s" % (self._device)))
+        if not self._running or self._reconnecting:
+            return
+        logger.warning("lost connection to %s: %s", self._device, exc)
+        self._link.set_down()
+        asyncio.ensure_future(self._reconnect())
+
+    def _data_received(self, data):
+        events = self._connection.receive_data(data)
+        if events and self.line.turnaround:
+            self._quiet_until = self._loop.time() + self.line.turnaround
+        for event in events:
+            solicited = isinstance(event, ResponseReceived)
+            if solicited:
+                response = self._responses.get(event.request.sequence_nr)
+                if response is not None and not response.done():
+                    response.set_result(event.frame)
+            else:
+                logger.debug("received: %r", event.frame)
+            for subscription in self._subscriptions:
+                if (subscription.responses or not solicited) and subscription.matches(event.frame):
+                    subscription.put(event.frame)
+
+    async def _wait_turnaround(self):
+        delay = self._quiet_until - self._loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _send(self, frame):
+        data = self._connection.to_bytes(frame)
+        try:
+            self._write(data)
+        except OSError as exc:
+            self._connection_lost(exc)
+            raise ConnectionError("lost connection to %s" % (self._device)) from exc
+        return len(data)
+
+    async def _send_recv(self, request, timeout=None):
+        response = self._loop.create_future()
+        self._responses[request.sequence_nr] = response
+        try:
+            await self._wait_turnaround()
+            start = self._loop.time()
+            with stage("serial write"):
+                wire_time = self._wire_time(self._send(request))
+            if timeout is None:
+                timeout = wire_time + self.rtt.timeout(request.destination)
+            try:
+                with stage("ack wait"):
+                    answ_pkt = await asyncio.wait_for(response, timeout)
+            except asyncio.TimeoutError:
+                self._timed_out(request.destination)
+                raise
+            self.rtt.update(request.destination, self._loop.time() - start - wire_time)
+            self._answered.add(request.destination)
+            self._timeouts = 0
+            self._timed_out_elements.clear()
+        finally:
+            del self._responses[request.sequence_nr]
+            self._connection.cancel(request)
+        return answ_pkt
+
+    async def _send_cmd(self, destination, command, data, timeout=None):
+        request = self._connection.request(destination, command, data)
+        response = await self._send_recv(request, timeout)
+        if response.cmd != request.cmd:
+            raise CommandFailedException("command %s to %d failed: %r" % (command, destination, response))
+        return response.payload
+
+    async def send_cmd(self, destination, command, data, timeout=None):
+        self.state.update(destination, command, data)
+        await self._link.wait()
+        async with self._request_lock:
+            return await self._send_cmd(destination, command, data, timeout)
+
+    async def _broadcast(self, frame, wait=None):
+        await self._wait_turnaround()
+        with stage("serial write"):
+            length = self._send(frame)
+        if wait is None:
+            wait = self._wire_time(length) + self._BROADCAST_GUARD
+        await asyncio.sleep(wait)
+        self._quiet_until = self._loop.time() + self.line.turnaround
+
+    async def _broadcast_cmd(self, command, data, wait=None):
+        await self._broadcast(self._connection.broadcast(command, data), wait)
+
+    async def broadcast_cmd(self, command, data, wait=None):
+        self.state.update(0xFF, command, data)
+        await self._link.wait()
+        async with self._request_lock:
+            await self._broadcast_cmd(command, data, wait)
+
+    async def _burst(self, frames):
+        # writes broadcast frames back to back and waits once for the line to
+        # drain, nobody answers them
+        await self._wait_turnaround()
+        length = 0
+        for frame in frames:
+            with stage("serial write"):
+                length += self._send(frame)
+        await asyncio.sleep(self._wire_time(length) + self._BROADCAST_GUARD)
+        self._quiet_until = self._loop.time() + self.line.turnaround
+
+    async def _replay(self):
+        # broadcasts go out in one burst, requests to single elements stay one
+        # at a time as the bus is half duplex, with a short fixed timeout and
+        # another attempt for the elements that did not ack
+        frames = 0
+        for command, common, values in self.state.replay_plan(self.present):
+            broadcasts = []
+            if common is not None:
+                broadcasts.append(self._connection.broadcast(command, common))
+            if self.packed and command == "setcolor":
+                broadcasts.extend(self._connection.broadcast("setcolors", payload) for payload in self._connection.color_payloads(values))
+                values = {}
+            if broadcasts:
+                await self._burst(broadcasts)
+                frames += len(broadcasts)
+            for attempt in range(self._REPLAY_ATTEMPTS):
+                missed = {}
+                for element, payload in values.items():
+                    frames += 1
+                    try:
+                        await self._send_cmd(element, command, payload, self._REPLAY_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        missed[element] = payload
+                    except CommandFailedException as e:
+                        logger.warning("replaying %s to %d failed: %s", command, element, e)
+                values = missed
+            if values:
+                logger.warning("elements %s did not ack the replayed %s", sorted(values), command)
+        if frames:
+            logger.info("replayed table state in %d frames", frames)
+
+    def _timed_out(self, element):
+        self.rtt.timed_out(element)
+        if self.line.baudrate == DEFAULT_BAUD_RATE or element not in self._answered:
+            return
+        self._timeouts += 1
+        self._timed_out_elements.add(element)
+        if self._timeouts >= self._FALLBACK_TIMEOUTS and len(self._timed_out_elements) >= self._FALLBACK_ELEMENTS and not self._falling_back:
+            self._falling_back = True
+            asyncio.ensure_future(self._fall_back())
+
+    async def _set_line_rate(self, baudrate):
+        # tell all elements to switch, then follow them
+        await self._broadcast_cmd("setup", struct.pack(">BI", SETUP_BAUDRATE, baudrate), self._BAUDRATE_SETTLE)
+        await self._follow_line_rate(baudrate)
+
+    async def _follow_line_rate(self, baudrate):
+        self.line.baudrate = baudrate
+        self._answered.clear()
+        self._timeouts = 0
+        self._timed_out_elements.clear()
+        self._close()
+        self._connection.reset()
+        try:
+            await asyncio.wait_for(self._open(), self._CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as exc:
+            self._connection_lost(exc)
+            raise ConnectionError("could not reopen %s at %d baud" % (self._device, baudrate)) from exc
+
+    async def _verify(self, element):
+        for _ in range(self._VERIFY_ATTEMPTS):
+            try:
+                await self._send_cmd(element, "version", b"")
+                return True
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def follow_baudrate(self, baudrate):
+        # changes the line rate of this side only, for elements that are at
+        # that rate already
+        await self._link.wait()
+        async with self._request_lock:
+            if baudrate != self.line.baudrate:
+                await self._follow_line_rate(baudrate)
+
+    async def change_baudrate(self, baudrate, elements=()):
+        # switches the whole bus to another line rate and checks that the
+        # given elements answer, falls back to the default rate if they don't
+        # or if there are none to check
+        await self._link.wait()
+        async with self._request_lock:
+            if baudrate == self.line.baudrate:
+                return True
+            logger.info("switching %s from %d to %d baud", self._device, self.line.baudrate, baudrate)
+            await self._set_line_rate(baudrate)
+            missing = [element for element in elements if not await self._verify(element)]
+            if elements and not missing:
+                return True
+            if missing:
+                logger.warning("elements %s do not answer at %d baud, falling back to %d", missing, baudrate, DEFAULT_BAUD_RATE)
+            else:
+                logger.warning("no elements to check at %d baud, falling back to %d", baudrate, DEFAULT_BAUD_RATE)
+            await self._set_line_rate(DEFAULT_BAUD_RATE)
+            await self._replay()
+            return False
+
+    async def _fall_back(self):
+        try:
+            async with self._request_lock:
+                if self.line.baudrate == DEFAULT_BAUD_RATE:
+                    return
+                logger.warning("elements stopped responding at %d baud, falling back to %d", self.line.baudrate, DEFAULT_BAUD_RATE)
+                await self._set_line_rate(DEFAULT_BAUD_RATE)
+                await self._replay()
+        except ConnectionError as e:
+            logger.warning("fall back to %d baud interrupted: %s", DEFAULT_BAUD_RATE, e)
+        finally:
+            self._falling_back = False
+
+    async def _broadcast_colors(self, colors, wait=None):
+        for payload in self._connection.color_payloads(colors):
+            await self._broadcast_cmd("setcolors", payload, wait)
+
+    async def broadcast_colors(self, colors, wait=None):
+        # setcolor for many elements at once, {element: 7 bytes}, without acks
+        if not colors:
+            return
+        for element, color in colors.items():
+            self.state.update(element, "setcolor", color)
+        await self._link.wait()
+        async with self._request_lock:
+            await self._broadcast_colors(colors, wait)
+
+    async def send_ota(self, destination, data, timeout=None):
+        if timeout is None:
+            timeout = self._OTA_TIMEOUT
+        await self._link.wait()
+        async with self._request_lock:
+            for d in self._connection.ota_fragments(data):
+                await self._send_cmd(destination, "ota", d, timeout=timeout)
+
+    async def broadcast_ota(self, data, wait=None):
+        if wait is None:
+            wait = self._OTA_WAIT
+        await self._link.wait()
+        async with self._request_lock:
+            for d in self._connection.ota_fragments(data):
+                await self._broadcast_cmd("ota", d, wait=wait)
+
+    async def send(self, pkt):
+        return self._send(pkt)
+
+    def subscribe(self, source=None, destination=None, cmd=None, maxsize=64, responses=False):
+        # unsolicited frames, and responses to requests when responses is set
+        subscription = Subscription(self, source, destination, cmd, maxsize, responses)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        self._subscriptions.remove(subscription)
+
+    async def receive(self, destination=0x00, timeout=None): # block until something received
+        with self.subscribe(destination=(destination, 0xFF)) as frames:
+            return await frames.get(timeout)
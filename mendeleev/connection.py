@@ -0,0 +1,137 @@
+import logging
+import struct
+
+from mendeleev.frame import COLOR_RECORD, FrameError, MendeleevFrame, pack_colors
+
+logger = logging.getLogger(__name__)
+
+class ResponseReceived:
+    __slots__ = ("request", "frame")
+
+    def __init__(self, request, frame):
+        self.request = request
+        self.frame = frame
+
+    def __repr__(self):
+        return "<ResponseReceived %r>" % (self.frame)
+
+class FrameReceived:
+    __slots__ = ("frame",)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __repr__(self):
+        return "<FrameReceived %r>" % (self.frame)
+
+# Sans-I/O protocol core: framing, sequence numbering, OTA fragmentation and
+# matching responses to requests. It never touches a file or a socket, it
+# turns requests into bytes to write and received bytes into events. The
+# backends in mendeleev.bus and below only move the bytes.
+class MendeleevConnection:
+    BUF_MAX = 240
+    PREAMBLE_LENGTH = 8
+    PREAMBLE_BYTE = b"\xA5"
+    PACKET_OVERHEAD = 9
+    MAX_PAYLOAD = BUF_MAX - PREAMBLE_LENGTH - PACKET_OVERHEAD
+    PREAMBLE = PREAMBLE_BYTE * PREAMBLE_LENGTH
+    _LENGTH_OFFSET = PREAMBLE_LENGTH + 5
+
+    def __init__(self, src_addr=0):
+        self.src_addr = src_addr
+        self._sequence_number = 0x0000
+        self._buf = b""
+        self._pending = {}
+
+    def _next_sequence_number(self):
+        sequence_number = self._sequence_number
+        self._sequence_number = ((self._sequence_number + 1) & 0xFFFF)
+        return sequence_number
+
+    def request(self, destination, command, payload=b""):
+        request = MendeleevFrame(source=self.src_addr, destination=destination, sequence_nr=self._next_sequence_number(), cmd=command, payload=payload)
+        self._pending[request.sequence_nr] = request
+        return request
+
+    def broadcast(self, command, payload=b""):
+        return MendeleevFrame(source=self.src_addr, destination=0xFF, sequence_nr=self._next_sequence_number(), cmd=command, payload=payload)
+
+    def cancel(self, request):
+        if self._pending.get(request.sequence_nr) is request:
+            del self._pending[request.sequence_nr]
+
+    def reset(self):
+        self._buf = b""
+        self._pending.clear()
+
+    @classmethod
+    def to_bytes(cls, frame):
+        return cls.PREAMBLE + bytes(frame)
+
+    @classmethod
+    def ota_fragments(cls, data, size=MAX_PAYLOAD):
+        result = []
+        fragment_idx = 0
+        frame_size = size - 1
+        total = len(data)
+        p = struct.pack("B", fragment_idx) + struct.pack('>I', total)
+        fragment_idx += 1
+        result.append(p)
+        for i in range(0, total, frame_size):
+            p = struct.pack("B", fragment_idx)
+            fragment_idx += 1
+            p += data[i:i+frame_size]
+            result.append(p)
+        return result
+
+    @classmethod
+    def color_payloads(cls, colors):
+        # setcolors payloads for {element: 7 bytes}, as many records per frame as fit
+        records = sorted(colors.items())
+        per_frame = cls.MAX_PAYLOAD // COLOR_RECORD.size
+        return [pack_colors(records[i:i + per_frame]) for i in range(0, len(records), per_frame)]
+
+    def _event(self, frame):
+        request = self._pending.get(frame.sequence_nr)
+        if request is not None and frame.source == request.destination and frame.answers(request):
+            del self._pending[frame.sequence_nr]
+            return ResponseReceived(request, frame)
+        return FrameReceived(frame)
+
+    def receive_data(self, data):
+        events = []
+        self._buf += data
+        while len(self._buf) >= self.PREAMBLE_LENGTH + self.PACKET_OVERHEAD:
+            if not self._buf.startswith(self.PREAMBLE):
+                start = self._buf.find(self.PREAMBLE, 1)
+                skipped = len(self._buf) - (self.PREAMBLE_LENGTH - 1) if start < 0 else start
+                logger.debug("skipping %d unknown bytes", skipped)
+                self._buf = self._buf[skipped:]
+                continue
+
+            if self._buf[self.PREAMBLE_LENGTH] == self.PREAMBLE[0]:
+                # longer preamble, 0xA5 is no valid destination
+                self._buf = self._buf[1:]
+                continue
+
+            data_len = struct.unpack_from(">H", self._buf, self._LENGTH_OFFSET)[0]
+            pkt_length = self.PREAMBLE_LENGTH + self.PACKET_OVERHEAD + data_len
+
+            if pkt_length > self.BUF_MAX:
+                logger.warning("invalid packet length: %d" % (pkt_length))
+                self._buf = self._buf[1:]
+                continue
+
+            if pkt_length > len(self._buf):
+                # not everything received yet
+                break
+
+            try:
+                frame = MendeleevFrame.from_bytes(self._buf[self.PREAMBLE_LENGTH:pkt_length])
+            except FrameError as e:
+                logger.warning("Invalid packet received: %s", e)
+                self._buf = self._buf[1:]
+                continue
+            self._buf = self._buf[pkt_length:]
+            events.append(self._event(frame))
+        return events
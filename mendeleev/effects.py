@@ -0,0 +1,185 @@
+import asyncio
+import logging
+
+import numpy as np
+
+from mendeleev.frame import NUM_ELEMENTS
+
+logger = logging.getLogger(__name__)
+
+CHANNELS_PER_ELEMENT = 7 # red, green, blue, warm white, white, uv, text
+
+def _periodic_table():
+    period_starts = [1, 3, 11, 19, 37, 55, 87, NUM_ELEMENTS + 1]
+    periods = np.zeros(NUM_ELEMENTS, dtype=np.int32)
+    groups = np.zeros(NUM_ELEMENTS, dtype=np.int32) # 0 for the f-block
+    for period, (start, end) in enumerate(zip(period_starts, period_starts[1:]), 1):
+        for z in range(start, end):
+            i = z - start
+            if period == 1:
+                group = 1 if z == 1 else 18
+            elif period <= 3:
+                group = i + 1 if i < 2 else i + 11
+            elif period <= 5:
+                group = i + 1
+            elif i < 2:
+                group = i + 1
+            elif i == 2:
+                group = 3
+            elif i < 17:
+                group = 0
+            else:
+                group = i - 13
+            periods[z - 1] = period
+            groups[z - 1] = group
+    return periods, groups
+
+ATOMIC_NUMBERS = np.arange(1, NUM_ELEMENTS + 1)
+PERIODS, GROUPS = _periodic_table()
+
+ORDERS = {
+    "atomic": ATOMIC_NUMBERS - 1,
+    "period": PERIODS - 1,
+    "group": np.where(GROUPS == 0, 3, GROUPS) - 1,
+}
+
+def parse_color(value):
+    if isinstance(value, str):
+        value = bytes.fromhex(value)
+    color = np.zeros(CHANNELS_PER_ELEMENT)
+    values = list(value)[:CHANNELS_PER_ELEMENT]
+    color[:len(values)] = values
+    return color
+
+def _order(params):
+    order = params.get("order", "atomic")
+    if order not in ORDERS:
+        raise ValueError("unknown order %s" % (order))
+    return ORDERS[order]
+
+# Effects render the whole table at once into a (NUM_ELEMENTS, 7) array of
+# floats in the 0..255 range, `t` is the time in seconds since the start.
+class Fade:
+    def __init__(self, params):
+        self.start = parse_color(params.get("from", "00"))
+        self.end = parse_color(params.get("to", "ff"))
+        self.duration = float(params.get("duration", 1.0))
+
+    def render(self, t, dt):
+        f = min(t / self.duration, 1.0) if self.duration > 0 else 1.0
+        return np.broadcast_to(self.start + (self.end - self.start) * f, (NUM_ELEMENTS, CHANNELS_PER_ELEMENT))
+
+class Chase:
+    def __init__(self, params):
+        self.color = parse_color(params.get("color", "ff"))
+        self.background = parse_color(params.get("background", "00"))
+        self.speed = float(params.get("speed", 10.0))
+        self.width = max(float(params.get("width", 1.0)), 1e-3)
+        self.key = _order(params)
+        self.length = self.key.max() + 1
+
+    def render(self, t, dt):
+        position = (t * self.speed) % self.length
+        distance = np.abs(self.key - position)
+        distance = np.minimum(distance, self.length - distance)
+        level = np.clip(1.0 - distance / self.width, 0.0, 1.0)[:, np.newaxis]
+        return self.background + (self.color - self.background) * level
+
+class Rainbow:
+    def __init__(self, params):
+        self.speed = float(params.get("speed", 0.2))
+        self.brightness = float(params.get("brightness", 255))
+        key = _order(params)
+        self.offset = key / (key.max() + 1)
+
+    def render(self, t, dt):
+        hue = (self.offset + t * self.speed) % 1.0
+        # hsv to rgb with full saturation and value
+        rgb = np.clip(np.abs((hue[:, np.newaxis] * 6.0 + np.array([0.0, 4.0, 2.0])) % 6.0 - 3.0) - 1.0, 0.0, 1.0)
+        frame = np.zeros((NUM_ELEMENTS, CHANNELS_PER_ELEMENT))
+        frame[:, :3] = rgb * self.brightness
+        return frame
+
+class Twinkle:
+    def __init__(self, params):
+        self.color = parse_color(params.get("color", "ffffff"))
+        self.background = parse_color(params.get("background", "00"))
+        self.rate = float(params.get("rate", 5.0)) # twinkles per second over the whole table
+        self.decay = float(params.get("decay", 0.5)) # seconds until a twinkle faded to 1/e
+        self.level = np.zeros(NUM_ELEMENTS)
+        self.rng = np.random.default_rng()
+
+    def render(self, t, dt):
+        self.level *= np.exp(-dt / self.decay) if self.decay > 0 else 0.0
+        sparks = self.rng.random(NUM_ELEMENTS) < self.rate * dt / NUM_ELEMENTS
+        self.level[sparks] = 1.0
+        return self.background + (self.color - self.background) * self.level[:, np.newaxis]
+
+EFFECTS = {
+    "fade": Fade,
+    "chase": Chase,
+    "rainbow": Rainbow,
+    "twinkle": Twinkle,
+}
+
+def create_effect(params):
+    name = params.get("effect")
+    if name not in EFFECTS:
+        raise ValueError("unknown effect %s" % (name))
+    return EFFECTS[name](params)
+
+# Renders the running effect at a fixed frame rate and hands the elements that
+# changed since the previous frame to `send`, as {element: 7 bytes}. Frames are
+# dropped when sending takes longer than a tick.
+class EffectsEngine:
+    def __init__(self, send, fps=25):
+        self.send = send
+        self.fps = fps
+        self.effect = None
+        self._task = None
+        self._last = None
+
+    def start(self, params):
+        self.effect = create_effect(params)
+        self._last = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        self.effect = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def render(self, t, dt):
+        frame = np.clip(np.rint(self.effect.render(t, dt)), 0, 255).astype(np.uint8)
+        if self._last is None:
+            changed = np.arange(NUM_ELEMENTS)
+        else:
+            changed = np.flatnonzero(np.any(frame != self._last, axis=1))
+        self._last = frame
+        return {int(i) + 1: frame[i].tobytes() for i in changed}
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.fps
+        effect = None
+        while self.effect is not None:
+            now = loop.time()
+            if effect is not self.effect:
+                effect = self.effect
+                start = last = now
+            try:
+                changes = self.render(now - start, now - last)
+                last = now
+                if changes:
+                    await self.send(changes)
+            except Exception as e:
+                logger.error("effect stopped")
+                logger.exception(e)
+                self.effect = None
+                break
+            # stay on the tick grid, skip the ticks we missed
+            now = loop.time()
+            next_tick = start + (int((now - start) / period) + 1) * period
+            await asyncio.sleep(next_tick - now)
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import struct
+from multiprocessing import shared_memory
+
+from mendeleev.frame import NUM_ELEMENTS
+
+CHANNELS_PER_ELEMENT = 7
+
+# Colour state of the whole table in shared memory, so an ingestion process
+# and a bus process can hand over updates without serialising them.
+#
+# layout: sequence counter (8 bytes), one dirty flag per element, the 7
+# channels of every element. Writers bump the sequence counter on every
+# change and write a byte to a wakeup pipe, a reader waits until fileno()
+# is readable, calls clear_wakeup() and collects the dirty elements. Only
+# the process that created the buffer unlinks it on close().
+class SharedFrameBuffer:
+    _SEQUENCE = struct.Struct("<Q")
+    _DIRTY_OFFSET = _SEQUENCE.size
+    _COLOR_OFFSET = _DIRTY_OFFSET + NUM_ELEMENTS
+    SIZE = _COLOR_OFFSET + NUM_ELEMENTS * CHANNELS_PER_ELEMENT
+
+    def __init__(self, name=None, lock=None, wakeup=None):
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=self.SIZE)
+            self._shm.buf[:self.SIZE] = bytes(self.SIZE)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self._wakeup = wakeup if wakeup is not None else multiprocessing.Pipe(duplex=False)
+        for connection in self._wakeup:
+            os.set_blocking(connection.fileno(), False)
+        self._buf = self._shm.buf
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __getstate__(self):
+        return {"name": self.name, "lock": self.lock, "wakeup": self._wakeup}
+
+    def __setstate__(self, state):
+        self.__init__(state["name"], state["lock"], state["wakeup"])
+
+    def fileno(self):
+        return self._wakeup[0].fileno()
+
+    def clear_wakeup(self):
+        try:
+            while os.read(self.fileno(), 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        for connection in self._wakeup:
+            connection.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _color_slice(self, element):
+        offset = self._COLOR_OFFSET + (element - 1) * CHANNELS_PER_ELEMENT
+        return slice(offset, offset + CHANNELS_PER_ELEMENT)
+
+    @property
+    def sequence(self):
+        return self._SEQUENCE.unpack_from(self._buf)[0]
+
+    def update(self, colors):
+        # colors: iterable of (element, 7 bytes), returns the number of changed elements
+        changed = 0
+        with self.lock:
+            for element, color in colors:
+                s = self._color_slice(element)
+                if self._buf[s] != color:
+                    self._buf[s] = color
+                    self._buf[self._DIRTY_OFFSET + element - 1] = 1
+                    changed += 1
+            if changed:
+                self._SEQUENCE.pack_into(self._buf, 0, (self.sequence + 1) & 0xFFFFFFFFFFFFFFFF)
+        if changed:
+            try:
+                os.write(self._wakeup[1].fileno(), b"\x00")
+            except BlockingIOError:
+                pass # the reader has not caught up, it is woken already
+        return changed
+
+    def get(self, element):
+        with self.lock:
+            return bytes(self._buf[self._color_slice(element)])
+
+    def take_dirty(self):
+        # returns {element: 7 bytes} of the elements changed since the last call
+        with self.lock:
+            dirty = bytes(self._buf[self._DIRTY_OFFSET:self._COLOR_OFFSET])
+            if not any(dirty):
+                return {}
+            self._buf[self._DIRTY_OFFSET:self._COLOR_OFFSET] = bytes(NUM_ELEMENTS)
+            return {i + 1: bytes(self._buf[self._color_slice(i + 1)]) for i, flag in enumerate(dirty) if flag}
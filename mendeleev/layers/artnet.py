@@ -5,6 +5,8 @@ from scapy.fields import (ByteEnumField, ByteField, FieldListField, LenField,
 from scapy.layers.inet import UDP
 from scapy.packet import Packet, bind_layers
 
+from mendeleev.artnet import ARTNET_PORT
+
 ARTNET_MAX_PORTS = 4 # The maximum ports per node built into the ArtNet protocol. This is always 4. Don't change it unless you really know what your doing
 ARTNET_SHORT_NAME_LENGTH = 18 # The length of the short name field. Always 18
 ARTNET_LONG_NAME_LENGTH = 64 # The length of the long name field. Always 64
@@ -94,7 +96,7 @@ class ArtNet(Packet):
         LEShortEnumField("opcode", 0, OPCODES),
     ]
 
-bind_layers(UDP, ArtNet, dport=6454)
+bind_layers(UDP, ArtNet, dport=ARTNET_PORT)
 
 class ArtNet_POLL(Packet):
     name = "POLL"
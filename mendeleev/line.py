@@ -0,0 +1,58 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BAUD_RATE = 38400
+
+# Line settings of a bus: the baud rate, RS485 direction control by the
+# driver (RTS high while sending) with its delays, and the turnaround time the
+# master keeps quiet after a frame before it sends the next one.
+class LineSettings:
+    BITS_PER_BYTE = 10 # 8N1
+
+    def __init__(self, baudrate=DEFAULT_BAUD_RATE, rs485=False, rts_level_for_tx=True, rts_level_for_rx=False,
+                 delay_before_tx=None, delay_before_rx=None, turnaround=0.0):
+        self.baudrate = baudrate
+        self.rs485 = rs485
+        self.rts_level_for_tx = rts_level_for_tx
+        self.rts_level_for_rx = rts_level_for_rx
+        self.delay_before_tx = delay_before_tx
+        self.delay_before_rx = delay_before_rx
+        self.turnaround = turnaround
+
+    def __repr__(self):
+        return "<LineSettings %d baud%s>" % (self.baudrate, ", rs485" if self.rs485 else "")
+
+    def wire_time(self, length):
+        return length * self.BITS_PER_BYTE / self.baudrate
+
+    def rs485_mode(self):
+        # pyserial settings, None when the driver does not control RTS
+        if not self.rs485:
+            return None
+        import serial.rs485
+        return serial.rs485.RS485Settings(rts_level_for_tx=self.rts_level_for_tx, rts_level_for_rx=self.rts_level_for_rx,
+                                          delay_before_tx=self.delay_before_tx, delay_before_rx=self.delay_before_rx)
+
+    def configure(self, ser):
+        # apply to an open pyserial port
+        ser.baudrate = self.baudrate
+        if self.rs485:
+            ser.rs485_mode = self.rs485_mode()
+
+    @staticmethod
+    def add_arguments(parser, speedup=True):
+        if speedup:
+            parser.add_argument("--baudrate", type=int, default=DEFAULT_BAUD_RATE, help="The line rate of the bus, elements still at the default rate are switched to it after connecting (default: %d)" % (DEFAULT_BAUD_RATE))
+        parser.add_argument("--rs485", action="store_true", help="Let the driver toggle RTS for the RS485 direction")
+        parser.add_argument("--rts-level-for-rx", action="store_true", help="RTS level while receiving, RTS is high while sending unless set")
+        parser.add_argument("--delay-before-tx", type=float, default=None, help="Delay between raising RTS and sending")
+        parser.add_argument("--delay-before-rx", type=float, default=None, help="Delay between the last byte sent and dropping RTS")
+        parser.add_argument("--turnaround", type=float, default=0.0, help="Minimum quiet time on the bus between two frames")
+
+    @classmethod
+    def from_args(cls, args):
+        # the bus always connects at the default rate, args.baudrate is what it
+        # looks for the elements at and otherwise switches them to
+        return cls(rs485=args.rs485, rts_level_for_tx=not args.rts_level_for_rx, rts_level_for_rx=args.rts_level_for_rx,
+                   delay_before_tx=args.delay_before_tx, delay_before_rx=args.delay_before_rx, turnaround=args.turnaround)
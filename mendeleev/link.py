@@ -0,0 +1,59 @@
+import asyncio
+import collections
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Reconnect delays: the first retry is immediate, then exponential backoff
+# with jitter so several bridges on one host don't retry in lockstep.
+class Backoff:
+    def __init__(self, initial=0.05, maximum=10.0, factor=2.0, jitter=0.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self._attempt = 0
+
+    def reset(self):
+        self._attempt = 0
+
+    def next(self):
+        attempt, self._attempt = self._attempt, self._attempt + 1
+        if attempt == 0:
+            return 0.0
+        delay = min(self.initial * self.factor ** (attempt - 1), self.maximum)
+        return delay * (1 - self.jitter * random.random())
+
+# Holds requests while the link is down. At most `maxlen` requests wait, when
+# more arrive the oldest one fails with a ConnectionError.
+class LinkGate:
+    def __init__(self, maxlen=64):
+        self.maxlen = maxlen
+        self.up = False
+        self._waiters = collections.deque()
+
+    async def wait(self):
+        if self.up:
+            return
+        while len(self._waiters) >= self.maxlen:
+            oldest = self._waiters.popleft()
+            if not oldest.done():
+                oldest.set_exception(ConnectionError("link down, request dropped"))
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def set_up(self):
+        self.up = True
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def set_down(self):
+        self.up = False
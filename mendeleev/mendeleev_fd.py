@@ -0,0 +1,133 @@
+import array
+import fcntl
+import logging
+import os
+import queue
+import select
+import struct
+import termios
+import threading
+
+from mendeleev.bus import MendeleevBus
+
+logger = logging.getLogger(__name__)
+
+# linux/serial.h
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+ASYNC_LOW_LATENCY = 1 << 13
+_SERIAL_FLAGS = 4 # index of flags in struct serial_struct
+TIOCSRS485 = 0x542F
+SER_RS485_ENABLED = 1 << 0
+SER_RS485_RTS_ON_SEND = 1 << 1
+SER_RS485_RTS_AFTER_SEND = 1 << 2
+_SERIAL_RS485 = struct.Struct("8I") # flags, delay_rts_before_send, delay_rts_after_send (ms), padding
+
+def set_low_latency(fd):
+    serial_struct = array.array("i", [0] * 32)
+    fcntl.ioctl(fd, TIOCGSERIAL, serial_struct, True)
+    serial_struct[_SERIAL_FLAGS] |= ASYNC_LOW_LATENCY
+    fcntl.ioctl(fd, TIOCSSERIAL, serial_struct)
+
+def set_rs485(fd, line):
+    flags = SER_RS485_ENABLED
+    if line.rts_level_for_tx:
+        flags |= SER_RS485_RTS_ON_SEND
+    if line.rts_level_for_rx:
+        flags |= SER_RS485_RTS_AFTER_SEND
+    delay_before_tx = int((line.delay_before_tx or 0) * 1000)
+    delay_before_rx = int((line.delay_before_rx or 0) * 1000)
+    fcntl.ioctl(fd, TIOCSRS485, _SERIAL_RS485.pack(flags, delay_before_tx, delay_before_rx, 0, 0, 0, 0, 0))
+
+# Raw file descriptor backend for Linux ttys. The port is put in raw mode with
+# the ASYNC_LOW_LATENCY flag set, so the driver pushes received bytes
+# immediately instead of on its next tick. Reads are done from the event
+# loop, writes from a dedicated writer thread, so a frame hits the wire
+# without waiting for the event loop to schedule it.
+class MendeleevFd(MendeleevBus):
+    _READ_SIZE = 4096
+    _WRITE_POLL = 1.0
+
+    def __init__(self, device, src_addr=0, rtt_min=0.01, rtt_max=1.0, max_pending=64, line=None):
+        super().__init__(device, src_addr, rtt_min, rtt_max, max_pending, line)
+        self._fd = None
+        self._writes = None
+        self._writer_thread = None
+
+    async def _open(self):
+        fd = os.open(self._device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure(fd)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._writes = queue.SimpleQueue()
+        self._writer_thread = threading.Thread(target=self._write_loop, args=(fd, self._writes), name="mendeleev-writer", daemon=True)
+        self._writer_thread.start()
+        self._loop.add_reader(fd, self._read_ready, fd)
+
+    def _configure(self, fd):
+        speed = getattr(termios, "B%d" % (self.line.baudrate), None)
+        if speed is None:
+            raise ValueError("unsupported baud rate: %d" % (self.line.baudrate))
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(fd)
+        iflag = 0
+        oflag = 0
+        lflag = 0
+        cflag &= ~(termios.CSIZE | termios.CSTOPB | termios.PARENB | termios.CRTSCTS)
+        cflag |= termios.CS8 | termios.CLOCAL | termios.CREAD
+        cc[termios.VMIN] = 0
+        cc[termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+        if self.line.rs485:
+            set_rs485(fd, self.line)
+        try:
+            set_low_latency(fd)
+        except OSError as e:
+            logger.warning("could not set low latency mode on %s: %s", self._device, e)
+
+    def _read_ready(self, fd):
+        try:
+            data = os.read(fd, self._READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            self._connection_lost(exc)
+            return
+        if not data:
+            self._connection_lost(None)
+            return
+        self._data_received(data)
+
+    def _write_loop(self, fd, writes):
+        while True:
+            data = writes.get()
+            if data is None:
+                return
+            view = memoryview(data)
+            try:
+                while view:
+                    try:
+                        view = view[os.write(fd, view):]
+                    except BlockingIOError:
+                        select.select([], [fd], [], self._WRITE_POLL)
+            except OSError as exc:
+                if self._fd == fd:
+                    self._loop.call_soon_threadsafe(self._connection_lost, exc)
+                return
+
+    def _write(self, data):
+        if self._fd is None:
+            raise ConnectionError("%s is not connected" % (self._device))
+        self._writes.put(data)
+
+    def _close(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        self._loop.remove_reader(fd)
+        self._writes.put(None)
+        self._writer_thread.join(self._WRITE_POLL)
+        self._writer_thread = None
+        os.close(fd)
@@ -0,0 +1,56 @@
+import logging
+import threading
+import serial
+
+from mendeleev.bus import MendeleevBus
+
+logger = logging.getLogger(__name__)
+
+# pyserial backend: a blocking reader thread hands received bytes to the
+# event loop, writes go straight to the port from the loop.
+class MendeleevThread(MendeleevBus):
+    _READ_TIMEOUT = 0.1
+    _READ_SIZE = 4096
+
+    def __init__(self, device, src_addr=0, rtt_min=0.01, rtt_max=1.0, max_pending=64, line=None):
+        super().__init__(device, src_addr, rtt_min, rtt_max, max_pending, line)
+        self._serial = None
+        self._reader_thread = None
+
+    async def _open(self):
+        ser = await self._loop.run_in_executor(None, lambda: serial.serial_for_url(self._device, baudrate=self.line.baudrate, timeout=self._READ_TIMEOUT))
+        try:
+            self.line.configure(ser)
+        except Exception:
+            ser.close()
+            raise
+        self._serial = ser
+        self._reader_thread = threading.Thread(target=self._read_loop, args=(ser,), name="mendeleev-reader", daemon=True)
+        self._reader_thread.start()
+
+    def _read_loop(self, ser):
+        try:
+            while self._serial is ser:
+                data = ser.read(ser.in_waiting or 1)
+                if data:
+                    self._loop.call_soon_threadsafe(self._data_received, data)
+        except Exception as exc:
+            if self._serial is ser:
+                self._loop.call_soon_threadsafe(self._connection_lost, exc)
+
+    def _write(self, data):
+        if self._serial is None:
+            raise ConnectionError("%s is not connected" % (self._device))
+        try:
+            self._serial.write(data)
+        except serial.SerialException as e:
+            raise ConnectionError(str(e)) from e
+
+    def _close(self):
+        if self._serial is None:
+            return
+        ser, self._serial = self._serial, None
+        ser.cancel_read()
+        self._reader_thread.join(self._READ_TIMEOUT * 2)
+        self._reader_thread = None
+        ser.close()
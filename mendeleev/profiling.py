@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+_NULL = contextlib.nullcontext()
+_active = None
+
+def stage(name):
+    # times a stage while a profiler runs, does nothing otherwise
+    if _active is None:
+        return _NULL
+    return _active.stage(name)
+
+def _summary(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    def percentile(p):
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000
+    return {
+        "count": len(values),
+        "total_ms": sum(values) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": values[-1] * 1000,
+    }
+
+# Times every callback the event loop runs, like asyncio debug mode does, but
+# without the traceback debug mode captures for every scheduled callback
+class _SlowCallbacks:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.messages = []
+        self._run = None
+
+    def install(self):
+        self._run = run = asyncio.Handle._run
+        def timed_run(handle):
+            start = time.perf_counter()
+            run(handle)
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.messages.append("Executing %r took %.3f seconds" % (handle, duration))
+        asyncio.Handle._run = timed_run
+
+    def uninstall(self):
+        asyncio.Handle._run = self._run
+
+class _Stage:
+    __slots__ = ("samples", "start")
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.samples.append(time.perf_counter() - self.start)
+
+# cProfile, event loop lag, slow callbacks and stage timings for a bounded
+# window, started and stopped at runtime. The results go to <name>-<time>.prof
+# (pstats) and <name>-<time>.json in the output directory. Over MQTT every
+# profiler listens on its own topic, <prefix>/0/profile/<name>.
+class Profiler:
+    LAG_INTERVAL = 0.05
+    SLOW_CALLBACK = 0.05
+
+    def __init__(self, name, directory=".", window=30.0):
+        self.name = name
+        self.directory = directory
+        self.window = window
+        self._profile = None
+        self._stop_handle = None
+        self._lag_task = None
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def stage(self, name):
+        return _Stage(self._stages.setdefault(name, []))
+
+    def start(self, window=None):
+        global _active
+        if self.active:
+            return
+        loop = asyncio.get_running_loop()
+        window = window or self.window
+        self._stages = {}
+        self._lag = []
+        self._started = time.time()
+        self._slow = _SlowCallbacks(self.SLOW_CALLBACK)
+        self._slow.install()
+        self._lag_task = asyncio.ensure_future(self._monitor_lag())
+        self._stop_handle = loop.call_later(window, self.stop)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        _active = self
+        logger.info("profiling for %.0fs", window)
+
+    def stop(self):
+        global _active
+        if not self.active:
+            return None
+        self._profile.disable()
+        profile, self._profile = self._profile, None
+        _active = None
+        self._slow.uninstall()
+        self._stop_handle.cancel()
+        self._lag_task.cancel()
+
+        base = os.path.join(self.directory, "%s-%s" % (self.name, time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started))))
+        profile.dump_stats(base + ".prof")
+        report = {
+            "name": self.name,
+            "start": self._started,
+            "duration": time.time() - self._started,
+            "loop_lag": _summary(self._lag),
+            "slow_callbacks": self._slow.messages,
+            "stages": {name: _summary(samples) for name, samples in sorted(self._stages.items())},
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("profile written to %s.prof and %s.json", base, base)
+        return base
+
+    def toggle(self):
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def topic(self, prefix):
+        return "%s/0/profile/%s" % (prefix, self.name)
+
+    def control(self, payload):
+        # MQTT payload: "stop", "start", empty or the window in seconds
+        payload = bytes(payload or b"").decode("utf-8").strip()
+        if payload == "stop":
+            return self.stop()
+        self.start(float(payload) if payload not in ("", "start") else None)
+        return None
+
+    async def _monitor_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.LAG_INTERVAL
+            await asyncio.sleep(self.LAG_INTERVAL)
+            self._lag.append(max(0.0, loop.time() - expected))
+
+    def install_signal_handler(self, signum):
+        asyncio.get_running_loop().add_signal_handler(signum, self.toggle)
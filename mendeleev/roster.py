@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+
+from mendeleev.bus import CommandFailedException
+from mendeleev.frame import NUM_ELEMENTS
+from mendeleev.line import DEFAULT_BAUD_RATE
+
+logger = logging.getLogger(__name__)
+
+class ElementAbsentException(Exception):
+    pass
+
+class RosterEntry:
+    __slots__ = ("version", "latency", "last_seen")
+
+    def __init__(self, version, latency, last_seen):
+        self.version = version
+        self.latency = latency
+        self.last_seen = last_seen
+
+    def to_dict(self):
+        return {"version": self.version, "latency": round(self.latency, 6)}
+
+# Keeps track of the elements that are present on the bus. Until the first
+# sweep finished every element is assumed to be present.
+class Roster:
+    _IDLE_POLL = 0.01
+    _MAX_DEFER = 1.0
+    _ATTEMPTS = 2 # one missed reply should not drop an element until the next sweep
+    _PROBE_TIMEOUT = 0.05
+
+    def __init__(self, bus, addresses=range(1, NUM_ELEMENTS + 1), concurrency=1):
+        self.bus = bus
+        self.addresses = list(addresses)
+        # RS485 is half duplex, only one element can answer at a time
+        self.concurrency = concurrency
+        self.elements = {}
+        self.swept = False
+        self._wakeup = None
+        self._waiters = []
+
+    def __contains__(self, element):
+        return not self.swept or element in self.elements
+
+    def check(self, element):
+        if element not in self:
+            raise ElementAbsentException("element %d is not present" % (element))
+
+    def to_dict(self):
+        return {str(element): entry.to_dict() for element, entry in sorted(self.elements.items())}
+
+    async def _wait_idle(self):
+        # background sweeps give way to regular traffic, but not forever
+        deadline = time.monotonic() + self._MAX_DEFER
+        while self.bus.busy() and time.monotonic() < deadline:
+            await asyncio.sleep(self._IDLE_POLL)
+
+    async def ping(self, element, background=False):
+        for _ in range(self._ATTEMPTS):
+            if background:
+                await self._wait_idle()
+            try:
+                version = await self.bus.send_cmd(element, "version", b"")
+                break
+            except asyncio.TimeoutError:
+                pass
+            except CommandFailedException as e:
+                # a nack is an answer all the same
+                logger.warning("unexpected answer from element %d: %s", element, e)
+                version = b""
+                break
+            except ConnectionError:
+                # the link dropped, that says nothing about the element
+                return self.elements.get(element)
+            except Exception as e:
+                logger.warning("pinging element %d failed: %s", element, e)
+                return None
+        else:
+            return None
+        return RosterEntry(version.rstrip(b"\x00").decode("utf-8", "replace"), self.bus.rtt.srtt(element), time.monotonic())
+
+    async def sweep(self, background=False):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def ping(element):
+            async with semaphore:
+                return element, await self.ping(element, background)
+
+        results = await asyncio.gather(*(ping(element) for element in self.addresses))
+        elements = {element: entry for element, entry in results if entry is not None}
+        changed = (not self.swept) or (elements.keys() != self.elements.keys()) or \
+            any(entry.version != self.elements[element].version for element, entry in elements.items())
+        for element in self.elements.keys() - elements.keys():
+            logger.info("element %d disappeared", element)
+        for element in elements.keys() - self.elements.keys():
+            logger.info("element %d (version %s) appeared", element, elements[element].version)
+        self.elements = elements
+        self.swept = True
+        return changed
+
+    async def _probe(self):
+        # true as soon as one element answers, with a short fixed timeout as
+        # the elements may well be at another line rate
+        for element in self.addresses:
+            try:
+                await self.bus.send_cmd(element, "version", b"", self._PROBE_TIMEOUT)
+                return True
+            except asyncio.TimeoutError:
+                pass
+            except CommandFailedException:
+                return True
+        return False
+
+    async def switch_baudrate(self, baudrate):
+        # the elements keep a raised line rate when the bridge restarts, so
+        # look for them there first and only switch from the default rate
+        # when nobody answers
+        if baudrate == self.bus.line.baudrate:
+            return True
+        await self.bus.follow_baudrate(baudrate)
+        if await self._probe():
+            logger.info("elements are at %d baud already", baudrate)
+            await self.sweep()
+            return True
+        await self.bus.follow_baudrate(DEFAULT_BAUD_RATE)
+        await self.sweep()
+        return await self.bus.change_baudrate(baudrate, list(self.elements))
+
+    def discover(self):
+        # asks run() for a sweep now, the future resolves once it is done
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    async def run(self, interval, on_change=None):
+        self._wakeup = asyncio.Event()
+        background = False
+        while True:
+            waiters, self._waiters = self._waiters, []
+            try:
+                if await self.sweep(background) and on_change is not None:
+                    await on_change(self)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("roster sweep failed")
+                logger.exception(e)
+            finally:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(self)
+            background = True
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
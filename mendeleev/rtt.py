@@ -0,0 +1,54 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Round-trip time estimation per element, as done for the TCP retransmission
+# timeout (RFC 6298). Elements we never heard from use the estimate over the
+# whole bus, healthy elements all run the same firmware. Only elements that
+# answered before back off on a timeout, an element that never answered is
+# most likely absent and should stay cheap to probe.
+class RttEstimator:
+    _ALPHA = 1 / 8
+    _BETA = 1 / 4
+    _K = 4
+    _BUS = None
+
+    def __init__(self, minimum=0.01, maximum=1.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self._srtt = {}
+        self._rttvar = {}
+        self._backoff = {}
+
+    def _update(self, key, rtt):
+        if key not in self._srtt:
+            self._srtt[key] = rtt
+            self._rttvar[key] = rtt / 2
+        else:
+            self._rttvar[key] = (1 - self._BETA) * self._rttvar[key] + self._BETA * abs(self._srtt[key] - rtt)
+            self._srtt[key] = (1 - self._ALPHA) * self._srtt[key] + self._ALPHA * rtt
+
+    def update(self, element, rtt):
+        rtt = max(rtt, 0.0)
+        self._update(element, rtt)
+        self._update(self._BUS, rtt)
+        self._backoff.pop(element, None)
+
+    def timed_out(self, element):
+        if element not in self._srtt:
+            return
+        backoff = self._backoff.get(element, 0)
+        if self.timeout(element) < self.maximum:
+            self._backoff[element] = backoff + 1
+            logger.debug("backing off timeout of element %s to %.3fs", element, self.timeout(element))
+
+    def srtt(self, element):
+        return self._srtt.get(element)
+
+    def timeout(self, element):
+        key = element if element in self._srtt else self._BUS
+        if key not in self._srtt:
+            return self.maximum
+        rto = self._srtt[key] + self._K * self._rttvar[key]
+        rto *= 2 ** self._backoff.get(element, 0)
+        return min(max(rto, self.minimum), self.maximum)
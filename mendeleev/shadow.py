@@ -0,0 +1,62 @@
+import asyncio
+import json
+import logging
+
+from mendeleev.frame import MODES, NUM_ELEMENTS, pack_colors
+
+logger = logging.getLogger(__name__)
+
+# Publishes the table state as retained MQTT topics,
+# <prefix>/status/<element>/state with the colour and mode of an element as
+# JSON, outside the <prefix>/<element>/<command> namespace of the bridge. Changes are collected and
+# published at most once per interval, only for the elements that changed.
+# The optional snapshot <prefix>/state holds the colours of all elements in
+# the setcolors payload format.
+class StateShadow:
+    def __init__(self, state, prefix, interval=0.1, snapshot=False):
+        self.state = state
+        self.prefix = prefix
+        self.interval = interval
+        self.snapshot = snapshot
+
+    def element_dict(self, element):
+        color = self.state.get(element, "setcolor")
+        mode = self.state.get(element, "setmode")
+        return {
+            "color": color.hex() if color is not None else None,
+            "mode": MODES.get(mode[0], mode[0]) if mode else None
+        }
+
+    def snapshot_payload(self):
+        colors = ((element, self.state.get(element, "setcolor")) for element in range(1, NUM_ELEMENTS + 1))
+        return pack_colors((element, color) for element, color in colors if color is not None)
+
+    async def publish(self, client):
+        dirty = self.state.take_dirty()
+        if not dirty:
+            return
+        try:
+            # concurrently, one PUBACK round trip for all of them
+            publishes = [client.publish("%s/status/%d/state" % (self.prefix, element), json.dumps(self.element_dict(element)), qos=1, retain=True)
+                         for element in sorted(dirty)]
+            if self.snapshot:
+                publishes.append(client.publish(self.prefix + "/state", self.snapshot_payload(), qos=1, retain=True))
+            await asyncio.gather(*publishes)
+        except Exception:
+            # try again next tick
+            self.state.mark_dirty(dirty)
+            raise
+        logger.debug("published state of %d elements", len(dirty))
+
+    async def run(self, get_client):
+        while True:
+            await asyncio.sleep(self.interval)
+            client = get_client()
+            if client is None:
+                continue
+            try:
+                await self.publish(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("could not publish state: %s", e)
@@ -0,0 +1,67 @@
+import collections
+import logging
+
+from mendeleev.frame import COMMANDS, NUM_ELEMENTS, unpack_colors
+
+logger = logging.getLogger(__name__)
+
+# Last colour and mode sent to every element, replayed after the link to the
+# bus was lost. Values are recorded when a request is issued, so requests
+# dropped during an outage still end up on the table. Elements whose values
+# changed are flagged dirty until take_dirty() collects them.
+class TableState:
+    TRACKED = ("setmode", "setcolor") # in replay order
+
+    def __init__(self):
+        self._state = {command: {} for command in self.TRACKED}
+        self._dirty = set()
+
+    def _set(self, command, element, payload):
+        if self._state[command].get(element) != payload:
+            self._state[command][element] = payload
+            self._dirty.add(element)
+
+    def update(self, destination, command, payload):
+        command = COMMANDS.get(command, command)
+        if command == "setcolors":
+            for element, color in unpack_colors(bytes(payload)):
+                self._set("setcolor", element, color)
+            return
+        if command not in self._state:
+            return
+        payload = bytes(payload)
+        if destination == 0xFF:
+            for element in range(1, NUM_ELEMENTS + 1):
+                self._set(command, element, payload)
+        else:
+            self._set(command, destination, payload)
+
+    def get(self, element, command):
+        return self._state[command].get(element)
+
+    def take_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def mark_dirty(self, elements):
+        self._dirty.update(elements)
+
+    def replay_plan(self, present=None):
+        # [(command, value to broadcast or None, {element: payload} to send
+        # one by one)] to restore the table, elements not in present skipped
+        plan = []
+        for command in self.TRACKED:
+            values = self._state[command]
+            if present is not None:
+                values = {element: payload for element, payload in values.items() if element in present}
+            if not values:
+                continue
+            common = None
+            if len(self._state[command]) == NUM_ELEMENTS:
+                common, count = collections.Counter(values.values()).most_common(1)[0]
+                if count > 1:
+                    values = {element: payload for element, payload in values.items() if payload != common}
+                else:
+                    common = None
+            plan.append((command, common, values))
+        return plan
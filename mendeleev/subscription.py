@@ -0,0 +1,78 @@
+import asyncio
+import logging
+
+from mendeleev.frame import COMMAND_CODES
+
+logger = logging.getLogger(__name__)
+
+# Frames received from the bus that match a filter on source, destination
+# and command. A filter is None for any value, a single value or a
+# collection of values, commands by code or name. Every subscription has its
+# own bounded queue, when a consumer falls behind the oldest frames are
+# dropped, the bus and the other subscribers never wait for it.
+#
+#     with bus.subscribe(destination=0xFF, cmd="setup") as frames:
+#         async for frame in frames:
+#             ...
+class Subscription:
+    def __init__(self, bus, source=None, destination=None, cmd=None, maxsize=64, responses=False):
+        self._bus = bus
+        self.source = self._values(source)
+        self.destination = self._values(destination)
+        self.cmd = self._values(cmd)
+        self.responses = responses
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+
+    @staticmethod
+    def _values(value):
+        if value is None:
+            return None
+        if isinstance(value, (int, str)):
+            value = (value,)
+        return frozenset(COMMAND_CODES.get(v, v) for v in value)
+
+    def matches(self, frame):
+        return (self.source is None or frame.source in self.source) and \
+            (self.destination is None or frame.destination in self.destination) and \
+            (self.cmd is None or frame.cmd in self.cmd)
+
+    def put(self, frame):
+        if self._closed:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+            logger.debug("subscriber too slow, dropped a frame")
+        self._queue.put_nowait(frame)
+
+    async def get(self, timeout=None):
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        frame = await asyncio.wait_for(self._queue.get(), timeout)
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        if self._closed:
+            return
+        self._bus._unsubscribe(self)
+        self._closed = True
+        # wake up a waiting consumer
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
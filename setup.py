@@ -16,7 +16,7 @@ setup(
     license='MIT',
     long_description=long_description,
     long_description_content_type="text/markdown",
-    packages=['mendeleev'],
+    packages=['mendeleev', 'mendeleev.layers'],
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -30,10 +30,14 @@ setup(
         'pyserial-asyncio==0.6',
         'scapy==2.4.5',
         'asyncio-mqtt==0.16.1',
-        'aioconsole==0.5.1'
+        'aioconsole==0.5.1',
     ],
+    extras_require={
+        'effects': ['numpy>=1.17'],
+    },
     scripts=[
         'bin/mqtt2mendeleev',
         'bin/artnet2mqtt',
+        'bin/artnet2mendeleev',
     ],
 )